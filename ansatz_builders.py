@@ -0,0 +1,154 @@
+import numpy as np
+import stim
+
+# Qiskit is only imported when a builder is used as a Qiskit ansatz (e.g. in run_vqe), not on the stim CAFQA path.
+
+# stim gates for Ry(k*pi/2) and Rz(k*pi/2), k = 0...3 (equal up to global phase)
+STIM_ROTATIONS = {
+    "Y": [None, "SQRT_Y", "Y", "SQRT_Y_DAG"],
+    "Z": [None, "S", "Z", "S_DAG"]
+}
+
+
+def entangling_pairs(n_qubits, entanglement="linear", coupling_map=None):
+    """
+    CX (control, target) pairs of one entangling layer.
+    n_qubits (Int): Number of qubits in circuit.
+    entanglement (String): ["linear", "circular", "pairwise", "full"]; ignored if coupling_map is given.
+    coupling_map (Iterable[(Int, Int)]): Custom CX pairs, applied in the given order.
+
+    Returns:
+    List[(Int, Int)] of CX pairs.
+    """
+    if coupling_map is not None:
+        pairs = [(int(a), int(b)) for a, b in coupling_map]
+        for a, b in pairs:
+            assert a != b and 0 <= a < n_qubits and 0 <= b < n_qubits, f"Invalid coupling ({a}, {b}) for {n_qubits} qubits."
+        return pairs
+    if entanglement == "linear":
+        return [(i, i + 1) for i in range(n_qubits - 1)]
+    elif entanglement == "circular":
+        # wraparound pair first, as in Qiskit's EfficientSU2 (CX(n-1, 0) does not commute with CX(0, 1))
+        pairs = [(i, i + 1) for i in range(n_qubits - 1)]
+        if n_qubits > 2:
+            pairs.insert(0, (n_qubits - 1, 0))
+        return pairs
+    elif entanglement == "pairwise":
+        return [(i, i + 1) for i in range(0, n_qubits - 1, 2)] + [(i, i + 1) for i in range(1, n_qubits - 1, 2)]
+    elif entanglement == "full":
+        return [(i, j) for i in range(n_qubits) for j in range(i + 1, n_qubits)]
+    else:
+        raise Exception(f'Invalid entanglement {entanglement}')
+
+
+class HardwareEfficientAnsatz:
+    """
+    EfficientSU2-type ansatz: (repetitions + 1) layers of Ry and Rz on every qubit, with an entangling CX layer between consecutive rotation layers.
+    Parameter i of layer l is Ry on qubit i for i < n_qubits and Rz on qubit i - n_qubits otherwise, at index 2*n_qubits*l + i (same order as Qiskit's EfficientSU2).
+    Can be used as ansatz_func in run_cafqa() and run_vqe(): calling it returns a Qiskit circuit, while vqe_cafqa_stim() builds the stim circuit directly via stim_circuit().
+    """
+
+    def __init__(self, entanglement="linear", coupling_map=None):
+        """
+        entanglement (String): ["linear", "circular", "pairwise", "full"]; ignored if coupling_map is given.
+        coupling_map (Iterable[(Int, Int)]): Custom CX pairs of one entangling layer.
+        """
+        self.entanglement = entanglement if coupling_map is None else "custom"
+        self.coupling_map = None if coupling_map is None else [tuple(pair) for pair in coupling_map]
+        self._pairs = {}
+
+    def __repr__(self):
+        if self.coupling_map is not None:
+            return f"HardwareEfficientAnsatz(coupling_map={self.coupling_map})"
+        return f"HardwareEfficientAnsatz(entanglement='{self.entanglement}')"
+
+    def pairs(self, n_qubits):
+        """
+        n_qubits (Int): Number of qubits in circuit.
+
+        Returns:
+        List[(Int, Int)] of CX pairs in one entangling layer.
+        """
+        if n_qubits not in self._pairs:
+            self._pairs[n_qubits] = entangling_pairs(n_qubits, self.entanglement, self.coupling_map)
+        return self._pairs[n_qubits]
+
+    def num_parameters(self, n_qubits, repetitions):
+        """
+        n_qubits (Int): Number of qubits in circuit.
+        repetitions (Int): # ansatz repetitions.
+
+        Returns:
+        (Int) #parameters.
+        """
+        return 2*n_qubits*(repetitions + 1)
+
+    def parameter_slots(self, n_qubits, repetitions):
+        """
+        n_qubits (Int): Number of qubits in circuit.
+        repetitions (Int): # ansatz repetitions.
+
+        Returns:
+        List[(String, Int, Int)] of (rotation axis "Y"/"Z", qubit, layer) for each parameter index.
+        """
+        return [(axis, q, layer) for layer in range(repetitions + 1) for axis in ("Y", "Z") for q in range(n_qubits)]
+
+    def stim_circuit(self, n_qubits, repetitions, parameters, circuit=None):
+        """
+        Append the Clifford ansatz to a stim circuit.
+        n_qubits (Int): Number of qubits in circuit.
+        repetitions (Int): # ansatz repetitions.
+        parameters (Iterable[Int]): CAFQA parameters (values in 0...3, factors for pi/2).
+        circuit (stim.Circuit): Circuit to append to, inplace (if None, a new circuit is created).
+
+        Returns:
+        (stim.Circuit) circuit with ansatz.
+        """
+        if circuit is None:
+            circuit = stim.Circuit()
+            circuit.append("I", range(n_qubits))
+        num_params = self.num_parameters(n_qubits, repetitions)
+        assert len(parameters) == num_params, f"Number of parameters given ({len(parameters)}) does not match ansatz ({num_params})."
+        ks = np.asarray(parameters, dtype=int).reshape(repetitions + 1, 2, n_qubits) % 4
+        cx_targets = [q for pair in self.pairs(n_qubits) for q in pair]
+        for layer in range(repetitions + 1):
+            for axis_idx, axis in enumerate(("Y", "Z")):
+                for k in (1, 2, 3):
+                    qubits = np.flatnonzero(ks[layer, axis_idx] == k)
+                    if len(qubits) > 0:
+                        circuit.append(STIM_ROTATIONS[axis][k], qubits)
+            if layer < repetitions and len(cx_targets) > 0:
+                circuit.append("CX", cx_targets)
+        return circuit
+
+    def __call__(self, n_qubits, repetitions):
+        """
+        Parameterized Qiskit circuit, for use with add_ansatz().
+        n_qubits (Int): Number of qubits in circuit.
+        repetitions (Int): # ansatz repetitions.
+
+        Returns:
+        (QuantumCircuit, Int) (ansatz, #parameters).
+        """
+        from qiskit import QuantumCircuit
+        from qiskit.circuit import ParameterVector
+
+        num_params = self.num_parameters(n_qubits, repetitions)
+        theta = ParameterVector("θ", num_params)
+        ansatz = QuantumCircuit(n_qubits)
+        for layer in range(repetitions + 1):
+            for q in range(n_qubits):
+                ansatz.ry(theta[2*n_qubits*layer + q], q)
+            for q in range(n_qubits):
+                ansatz.rz(theta[2*n_qubits*layer + n_qubits + q], q)
+            if layer < repetitions:
+                ansatz.barrier()
+                for control, target in self.pairs(n_qubits):
+                    ansatz.cx(control, target)
+                ansatz.barrier()
+        return ansatz, num_params
+
+
+efficientsu2_linear = HardwareEfficientAnsatz("linear")
+efficientsu2_circular = HardwareEfficientAnsatz("circular")
+efficientsu2_pairwise = HardwareEfficientAnsatz("pairwise")
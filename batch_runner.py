@@ -0,0 +1,343 @@
+import numpy as np
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from timeit import default_timer as timer
+
+# thread pools of numerical libraries, limited per worker process
+THREAD_ENV_VARS = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS"]
+# files in a job's save directory that are appended to during a run
+TRACE_FILES = ["cafqa_loss.txt", "cafqa_params.txt", "vqe_loss.txt", "vqe_params.txt", "hypermapper_log.log", "hypermapper_output.csv"]
+
+
+def available_cores():
+    """
+    Returns:
+    (Int) Number of cores this process may run on.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def job_key(job):
+    """
+    Identify a job by its settings (everything but its name), so that renaming a job does not re-run it.
+    job (Dict): Job specification.
+
+    Returns:
+    (String) hex digest.
+    """
+    settings = {key: value for key, value in job.items() if key != "name"}
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+def load_config(config_path):
+    """
+    Read a batch configuration file. Example:
+    {
+        "result_store": "results.sqlite",
+        "work_dir": "runs",
+        "max_workers": 4,
+        "threads_per_job": 1,
+        "defaults": {"cafqa": {"budget": 100}, "vqe_kwargs": {"ansatz_reps": 1}},
+        "jobs": [
+            {"name": "H2", "system": {"type": "molecule", "atom_string": "H 0 0 0; H 0 0 1.0", "new_num_orbitals": 2}},
+            {"name": "ising8", "system": {"type": "ising", "N": 8, "Jx": 1.0, "h": 0.5},
+             "vqe": {"budget": 50, "shots": 8192, "mode": "noisy_sim", "backend": "FakeMumbai", "optimizer": "spsa"}}
+        ]
+    }
+    Each job is merged into "defaults" (one level deep). "ansatz_func" in "vqe_kwargs" is the name of an ansatz function (e.g. "efficientsu2_linear")
+    or the keyword arguments of a HardwareEfficientAnsatz (e.g. {"coupling_map": [[0, 1], [1, 2]]}). A job runs CAFQA, and VQE initialized with the CAFQA result if it has a "vqe" entry.
+    "cafqa": {"evaluator": "light_cone"} evaluates CAFQA energies with a LocalHamiltonian (faster than the stim tableau above about 500 qubits).
+    Relative paths are relative to the configuration file.
+    config_path (String): Path to JSON configuration file.
+
+    Returns:
+    (Dict) configuration with absolute paths and merged jobs.
+    """
+    with open(config_path) as config_file:
+        config = json.load(config_file)
+    base_dir = os.path.dirname(os.path.abspath(config_path))
+    config["result_store"] = os.path.join(base_dir, config.get("result_store", "results.sqlite"))
+    config["work_dir"] = os.path.join(base_dir, config.get("work_dir", "runs"))
+    config.setdefault("max_workers", None)
+    config.setdefault("threads_per_job", 1)
+    defaults = config.get("defaults", {})
+    jobs = []
+    for idx, job in enumerate(config["jobs"]):
+        merged = {}
+        for key in set(defaults) | set(job):
+            if isinstance(defaults.get(key), dict) and isinstance(job.get(key), dict):
+                merged[key] = {**defaults[key], **job[key]}
+            else:
+                merged[key] = job.get(key, defaults.get(key))
+        merged.setdefault("name", f"job{idx}")
+        assert "system" in merged, f"Job {merged['name']} has no system."
+        merged.setdefault("cafqa", {})
+        merged.setdefault("vqe_kwargs", {})
+        jobs.append(merged)
+    config["jobs"] = jobs
+    return config
+
+
+class ResultStore:
+    """
+    SQLite store holding the results of all batch jobs, indexed by job key and name.
+    Only the scheduling process writes to it.
+    """
+
+    def __init__(self, path):
+        """
+        path (String): Path to SQLite database (created if it does not exist).
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                job_key TEXT PRIMARY KEY,
+                name TEXT,
+                status TEXT,
+                system_type TEXT,
+                n_qubits INTEGER,
+                cafqa_energy REAL,
+                cafqa_params TEXT,
+                vqe_energy REAL,
+                vqe_params TEXT,
+                error TEXT,
+                wall_time REAL,
+                finished_at TEXT,
+                job TEXT
+            )""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS results_name ON results (name)")
+        self.connection.commit()
+
+    def done_keys(self):
+        """
+        Returns:
+        Set[String] of keys of successfully finished jobs.
+        """
+        return {row[0] for row in self.connection.execute("SELECT job_key FROM results WHERE status = 'done'")}
+
+    def add(self, key, job, result=None, error=None, wall_time=None):
+        """
+        Insert or replace the result of a job.
+        key (String): Job key.
+        job (Dict): Job specification.
+        result (Dict): Output of run_job() (None if the job failed).
+        error (String): Error message if the job failed.
+        wall_time (Float): Job run time in s.
+        """
+        result = result or {}
+        self.connection.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                key,
+                job["name"],
+                "failed" if error is not None else "done",
+                job["system"]["type"],
+                result.get("n_qubits"),
+                result.get("cafqa_energy"),
+                json.dumps(result.get("cafqa_params")),
+                result.get("vqe_energy"),
+                json.dumps(result.get("vqe_params")),
+                error,
+                wall_time,
+                datetime.now().isoformat(timespec="seconds"),
+                json.dumps(job, sort_keys=True)
+            )
+        )
+        self.connection.commit()
+
+    def results(self, name=None):
+        """
+        name (String): Only return results of jobs with this name (if None, return all).
+
+        Returns:
+        List[Dict] of stored results, parameters and job specifications decoded from JSON.
+        """
+        cursor = self.connection.execute("SELECT * FROM results" + (" WHERE name = ?" if name is not None else ""), (name,) if name is not None else ())
+        columns = [col[0] for col in cursor.description]
+        rows = []
+        for row in cursor:
+            entry = dict(zip(columns, row))
+            for col in ("cafqa_params", "vqe_params", "job"):
+                entry[col] = json.loads(entry[col]) if entry[col] is not None else None
+            rows.append(entry)
+        return rows
+
+    def close(self):
+        self.connection.close()
+
+
+def build_hamiltonian(system):
+    """
+    system (Dict): {"type": "molecule", **molecule() kwargs} or {"type": "ising", **ising_model() kwargs}.
+
+    Returns:
+    (Iterable[Float], Iterable[String], String) (Pauli coefficients, Pauli strings, initial bitstring)
+    """
+    from vqe_experiment import molecule, ising_model
+
+    kwargs = {key: value for key, value in system.items() if key != "type"}
+    if system["type"] == "molecule":
+        return molecule(**kwargs)
+    elif system["type"] == "ising":
+        return ising_model(**kwargs)
+    else:
+        raise Exception(f'Invalid system type {system["type"]}')
+
+def resolve_backend(name):
+    """
+    name (String): Name of a fake backend in qiskit.providers.fake_provider, e.g. "FakeMumbai" (None for no backend).
+
+    Returns:
+    (IBM backend) backend instance.
+    """
+    if name is None:
+        return None
+    from qiskit.providers import fake_provider
+
+    return getattr(fake_provider, name)()
+
+def run_job(job, save_dir):
+    """
+    Run CAFQA (and optionally VQE initialized with the CAFQA result) for one job. Executed in a worker process.
+    job (Dict): Job specification, see load_config().
+    save_dir (String): Directory for the hypermapper and loss/parameter files of this job.
+
+    Returns:
+    (Dict) n_qubits, cafqa_energy, cafqa_params and, if VQE was run, vqe_energy and vqe_params.
+    """
+    import vqe_experiment
+
+    os.makedirs(save_dir, exist_ok=True)
+    # a retry of a failed job reuses its directory; start the traces from scratch
+    for trace_file in TRACE_FILES:
+        trace_path = os.path.join(save_dir, trace_file)
+        if os.path.exists(trace_path):
+            os.remove(trace_path)
+    coeffs, paulis, bitstring = build_hamiltonian(job["system"])
+    n_qubits = len(paulis[0])
+    vqe_kwargs = dict(job["vqe_kwargs"])
+    vqe_kwargs.setdefault("ansatz_reps", 1)
+    vqe_kwargs.setdefault("HF_bitstring", bitstring)
+    if isinstance(vqe_kwargs.get("ansatz_func"), dict):
+        # e.g. {"coupling_map": [[0, 1], [1, 2]]}
+        vqe_kwargs["ansatz_func"] = vqe_experiment.HardwareEfficientAnsatz(**vqe_kwargs["ansatz_func"])
+    elif "ansatz_func" in vqe_kwargs:
+        vqe_kwargs["ansatz_func"] = getattr(vqe_experiment, vqe_kwargs["ansatz_func"])
+
+    # "light_cone" evaluation only pays off for large lattice models, see LocalHamiltonian
+    cafqa_paulis = vqe_experiment.LocalHamiltonian(coeffs, paulis) if job["cafqa"].get("evaluator") == "light_cone" else paulis
+
+    stdout = sys.stdout
+    cafqa_energy, cafqa_params = vqe_experiment.run_cafqa(
+        n_qubits=n_qubits,
+        coeffs=coeffs,
+        paulis=cafqa_paulis,
+        param_guess=job["cafqa"].get("param_guess", []),
+        budget=job["cafqa"].get("budget", 100),
+        save_dir=save_dir,
+        loss_file="cafqa_loss.txt",
+        params_file="cafqa_params.txt",
+        vqe_kwargs=vqe_kwargs
+    )
+    sys.stdout = stdout
+    result = {"n_qubits": n_qubits, "cafqa_energy": float(cafqa_energy), "cafqa_params": [int(x) for x in cafqa_params]}
+
+    if job.get("vqe") is not None:
+        vqe_settings = job["vqe"]
+        vqe_energy, vqe_params = vqe_experiment.run_vqe(
+            n_qubits=n_qubits,
+            coeffs=coeffs,
+            paulis=paulis,
+            param_guess=np.array(cafqa_params)*np.pi/2,
+            budget=vqe_settings.get("budget", 100),
+            shots=vqe_settings.get("shots", 8192),
+            mode=vqe_settings.get("mode", "no_noisy_sim"),
+            backend=resolve_backend(vqe_settings.get("backend")),
+            save_dir=save_dir,
+            loss_file="vqe_loss.txt",
+            params_file="vqe_params.txt",
+            vqe_kwargs=vqe_kwargs,
+            optimizer=vqe_settings.get("optimizer", "imfil"),
+            optimizer_kwargs=vqe_settings.get("optimizer_kwargs")
+        )
+        result["vqe_energy"] = float(vqe_energy)
+        result["vqe_params"] = [float(x) for x in vqe_params]
+    return result
+
+def _timed_run_job(job, save_dir):
+    start = timer()
+    result = run_job(job, save_dir)
+    return result, timer() - start
+
+def run_batch(config_path):
+    """
+    Run all jobs of a batch configuration on a local process pool, skipping jobs whose results are already in the result store.
+    At most available_cores() // threads_per_job jobs (and at most max_workers) run concurrently.
+    config_path (String): Path to JSON configuration file, see load_config().
+
+    Returns:
+    (ResultStore) store with all results (caller closes it).
+    """
+    config = load_config(config_path)
+    os.makedirs(config["work_dir"], exist_ok=True)
+    store = ResultStore(config["result_store"])
+    done = store.done_keys()
+    pending = {}
+    for job in config["jobs"]:
+        key = job_key(job)
+        if key in pending:
+            print(f"Skipping {job['name']}, duplicate of {pending[key]['name']} (same settings).")
+            continue
+        if key in done:
+            print(f"Skipping {job['name']}, result exists.")
+            continue
+        pending[key] = job
+    if len(pending) == 0:
+        return store
+
+    threads_per_job = max(1, int(config["threads_per_job"]))
+    max_workers = max(1, available_cores()//threads_per_job)
+    if config["max_workers"] is not None:
+        max_workers = min(max_workers, int(config["max_workers"]))
+    max_workers = min(max_workers, len(pending))
+    # inherited by the spawned workers before they import numpy; restored afterwards so the caller's limits are unchanged
+    previous_env = {var: os.environ.get(var) for var in THREAD_ENV_VARS}
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads_per_job)
+    print(f"Running {len(pending)} jobs on {max_workers} workers ({threads_per_job} threads each).")
+
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = {
+                executor.submit(_timed_run_job, job, os.path.join(config["work_dir"], f"{job['name']}_{key[:12]}")): key
+                for key, job in pending.items()
+            }
+            for future in as_completed(futures):
+                key = futures[future]
+                job = pending[key]
+                try:
+                    result, wall_time = future.result()
+                    store.add(key, job, result=result, wall_time=wall_time)
+                    print(f"Finished {job['name']}: CAFQA energy {result['cafqa_energy']}, in {wall_time} s.")
+                except Exception as e:
+                    store.add(key, job, error=repr(e))
+                    print(f"Failed {job['name']}: {e!r}")
+    finally:
+        for var, value in previous_env.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+    return store
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) == 2, "Usage: python batch_runner.py <config.json>"
+    run_batch(sys.argv[1]).close()
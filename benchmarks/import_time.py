@@ -0,0 +1,53 @@
+"""
+Measure the import time of the CAFQA modules, each in a fresh interpreter, and report which heavy dependencies were loaded.
+Usage: python benchmarks/import_time.py [repeats]
+"""
+import subprocess
+import sys
+import os
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["hamiltonian_storage", "gradient_optimizers", "ansatz_builders", "local_hamiltonian", "circuit_manipulation", "vqe_helpers", "vqe_experiment", "batch_runner"]
+HEAVY_DEPENDENCIES = ["qiskit", "qiskit_nature", "pyscf", "skquant", "hypermapper", "scipy"]
+
+MEASURE = """
+import sys
+from timeit import default_timer as timer
+start = timer()
+import {module}
+end = timer()
+loaded = [dep for dep in {heavy} if dep in sys.modules]
+print(end - start, ",".join(loaded))
+"""
+
+
+def measure(module, repeats):
+    """
+    Import a module in fresh interpreters.
+    module (String): Module name.
+    repeats (Int): Number of fresh interpreters.
+
+    Returns:
+    (Float, String) (minimum import time in s, comma-separated heavy dependencies that were loaded).
+    """
+    times = []
+    loaded = ""
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", MEASURE.format(module=module, heavy=HEAVY_DEPENDENCIES)],
+            cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.split()
+        times.append(float(output[0]))
+        loaded = output[1] if len(output) > 1 else ""
+    return min(times), loaded
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for module in MODULES:
+        import_time, loaded = measure(module, repeats)
+        print(f"{module:<24} {import_time*1e3:8.1f} ms   heavy deps loaded: {loaded or '-'}")
+
+
+if __name__ == "__main__":
+    main()
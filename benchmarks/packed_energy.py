@@ -0,0 +1,55 @@
+"""
+Compare the per-evaluation cost of PackedHamiltonian.energy() with the per-term peek_observable_expectation() loop of vqe_cafqa_stim().
+Usage: python benchmarks/packed_energy.py [num_terms] [n_qubits] [num_threads]
+"""
+import os
+import sys
+import tempfile
+import numpy as np
+import stim
+from timeit import default_timer as timer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from hamiltonian_storage import save_hamiltonian
+
+
+def best_time(func, repeats=3):
+    """
+    func (Function): Function without arguments.
+    repeats (Int): Number of calls.
+
+    Returns:
+    (Float, Any) (minimum run time in s, result of last call).
+    """
+    times = []
+    for _ in range(repeats):
+        start = timer()
+        result = func()
+        times.append(timer() - start)
+    return min(times), result
+
+
+def main():
+    num_terms = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    n_qubits = int(sys.argv[2]) if len(sys.argv) > 2 else 24
+    num_threads = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    rng = np.random.default_rng(0)
+    paulis = ["".join(p) for p in rng.choice(list("IXYZ"), size=(num_terms, n_qubits))]
+    coeffs = rng.normal(size=num_terms)
+    sim = stim.TableauSimulator()
+    sim.do_tableau(stim.Tableau.random(n_qubits), list(range(n_qubits)))
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        store = save_hamiltonian(store_dir, coeffs, paulis)
+        store.num_threads = num_threads
+        packed_time, packed_energy = best_time(lambda: store.energy(sim.current_inverse_tableau()))
+        del store
+    peek_time, peek_energy = best_time(lambda: np.dot(coeffs, [sim.peek_observable_expectation(stim.PauliString(p)) for p in paulis]))
+    assert abs(packed_energy - peek_energy) < 1e-8, f"Energies differ: {packed_energy} vs {peek_energy}"
+    print(f"{num_terms} terms, {n_qubits} qubits")
+    print(f"PackedHamiltonian.energy ({num_threads} threads) {packed_time*1e3:8.1f} ms")
+    print(f"peek_observable_expectation loop   {peek_time*1e3:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
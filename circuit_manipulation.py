@@ -1,8 +1,8 @@
-from qiskit.converters import circuit_to_dag, dag_to_circuit
-from qiskit import QuantumCircuit
 import numpy as np
 import stim
 
+# Qiskit is imported inside the functions that need it, so that stim-only users do not pay its import time.
+
 def transform_to_allowed_gates(circuit, **kwargs):
     """
     circuit (QuantumCircuit): Circuit with only Clifford gates (1q rotations Ry, Rz must be k*pi/2).
@@ -11,6 +11,9 @@ def transform_to_allowed_gates(circuit, **kwargs):
     Returns:
     (QuantumCircuit) Logically equivalent circuit but with gates in required format (no Ry, Rz gates; only S, Sdg, H, X, Z).
     """
+    from qiskit.converters import circuit_to_dag, dag_to_circuit
+    from qiskit import QuantumCircuit
+
     dag = circuit_to_dag(circuit)
     threshold = 1e-3
     # we will substitute nodes inplace
@@ -74,6 +77,8 @@ def qiskit_to_stim(circuit):
     Returns:
     (stim._stim_sse2.Circuit) stim circuit.
     """
+    from qiskit import QuantumCircuit
+
     assert isinstance(circuit, QuantumCircuit), f"Circuit is not a Qiskit QuantumCircuit."
     allowed_gates = ["X", "Y", "Z", "H", "CX", "S", "S_DAG", "SQRT_X", "SQRT_X_DAG"]
     stim_circ = stim.Circuit()
@@ -0,0 +1,86 @@
+import numpy as np
+
+
+def adam(fun_and_grad, x0, budget, learning_rate=0.05, beta1=0.9, beta2=0.999, epsilon=1e-8):
+    """
+    Adam optimizer.
+    fun_and_grad (Function): Takes parameters, returns (loss, gradient), e.g. vqe_gradient().
+    x0 (Iterable[Float]): Initial parameters.
+    budget (Int): Number of iterations (= calls of fun_and_grad).
+    learning_rate (Float): Step size.
+    beta1 (Float): Decay rate of the first moment estimate.
+    beta2 (Float): Decay rate of the second moment estimate.
+    epsilon (Float): Regularization of the update denominator.
+
+    Returns:
+    (Float, np.ndarray) (lowest loss seen, corresponding parameters).
+    """
+    x = np.array(x0, dtype=float)
+    m = np.zeros_like(x)
+    v = np.zeros_like(x)
+    best_loss, best_x = np.inf, x.copy()
+    for k in range(1, budget + 1):
+        loss, grad = fun_and_grad(x)
+        if loss < best_loss:
+            best_loss, best_x = loss, x.copy()
+        m = beta1*m + (1 - beta1)*grad
+        v = beta2*v + (1 - beta2)*grad**2
+        m_hat = m/(1 - beta1**k)
+        v_hat = v/(1 - beta2**k)
+        x = x - learning_rate*m_hat/(np.sqrt(v_hat) + epsilon)
+    return best_loss, best_x
+
+def spsa(energies, x0, budget, a=0.2, c=0.1, A=None, alpha=0.602, gamma=0.101, seed=None):
+    """
+    Simultaneous perturbation stochastic approximation. The current point and both perturbed points are evaluated as one batch per iteration.
+    energies (Function): Takes a list of parameter sets, returns their losses, e.g. vqe_energies().
+    x0 (Iterable[Float]): Initial parameters.
+    budget (Int): Number of iterations (= calls of energies).
+    a (Float): Step size scale, a_k = a/(k+1+A)^alpha.
+    c (Float): Perturbation scale, c_k = c/(k+1)^gamma.
+    A (Float): Step size stability constant (if None, use 10% of budget).
+    alpha (Float): Step size decay exponent.
+    gamma (Float): Perturbation decay exponent.
+    seed (Int): Random seed for the perturbations.
+
+    Returns:
+    (Float, np.ndarray) (lowest loss seen, corresponding parameters).
+    """
+    rng = np.random.default_rng(seed)
+    if A is None:
+        A = 0.1*budget
+    x = np.array(x0, dtype=float)
+    best_loss, best_x = np.inf, x.copy()
+    for k in range(budget):
+        a_k = a/(k + 1 + A)**alpha
+        c_k = c/(k + 1)**gamma
+        delta = rng.choice([-1., 1.], size=len(x))
+        loss, loss_plus, loss_minus = energies([x, x + c_k*delta, x - c_k*delta])
+        if loss < best_loss:
+            best_loss, best_x = loss, x.copy()
+        grad = (loss_plus - loss_minus)/(2*c_k)*delta
+        x = x - a_k*grad
+    return best_loss, best_x
+
+def lbfgsb(fun_and_grad, x0, budget, bounds=None):
+    """
+    L-BFGS-B optimizer (scipy). Best suited for exact or high-shot gradients, as the line search is sensitive to shot noise.
+    fun_and_grad (Function): Takes parameters, returns (loss, gradient), e.g. vqe_gradient().
+    x0 (Iterable[Float]): Initial parameters.
+    budget (Int): Max number of iterations.
+    bounds (Iterable[(Float, Float)]): Parameter bounds (if None, unbounded).
+
+    Returns:
+    (Float, np.ndarray) (lowest loss seen, corresponding parameters).
+    """
+    from scipy.optimize import minimize
+
+    best = [np.inf, np.array(x0, dtype=float)]
+    def tracked(x):
+        loss, grad = fun_and_grad(x)
+        if loss < best[0]:
+            best[0], best[1] = loss, np.array(x)
+        return loss, grad
+
+    minimize(tracked, x0, jac=True, method="L-BFGS-B", bounds=bounds, options={"maxiter": budget})
+    return best[0], best[1]
@@ -0,0 +1,181 @@
+import numpy as np
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+def pauli_strings_to_symplectic(paulis, n_qubits):
+    """
+    Convert Pauli strings into packed symplectic form.
+    paulis (Iterable[String]): Pauli strings, character i acts on qubit i (stim ordering).
+    n_qubits (Int): Number of qubits.
+
+    Returns:
+    (np.ndarray) uint8 array of shape (#paulis, 2*ceil(n_qubits/8)), each row holding the packed X bits followed by the packed Z bits.
+    """
+    labels = np.array([list(p) for p in paulis], dtype="U1").reshape(-1, n_qubits)
+    xs = (labels == "X") | (labels == "Y")
+    zs = (labels == "Z") | (labels == "Y")
+    return np.concatenate([np.packbits(xs, axis=1, bitorder="little"), np.packbits(zs, axis=1, bitorder="little")], axis=1)
+
+def symplectic_to_pauli_strings(packed, n_qubits):
+    """
+    Inverse of pauli_strings_to_symplectic.
+    packed (np.ndarray): Packed symplectic rows.
+    n_qubits (Int): Number of qubits.
+
+    Returns:
+    List[String] of Pauli strings.
+    """
+    xs, zs = unpack_symplectic(packed, n_qubits)
+    labels = np.array(["I", "X", "Z", "Y"])[xs.astype(np.uint8) + 2*zs.astype(np.uint8)]
+    return ["".join(row) for row in labels]
+
+def unpack_symplectic(packed, n_qubits):
+    """
+    Unpack packed symplectic rows.
+    packed (np.ndarray): Packed symplectic rows.
+    n_qubits (Int): Number of qubits.
+
+    Returns:
+    (np.ndarray, np.ndarray) boolean X and Z bits, both of shape (#rows, n_qubits).
+    """
+    n_bytes = packed.shape[1]//2
+    xs = np.unpackbits(packed[:, :n_bytes], axis=1, count=n_qubits, bitorder="little").astype(bool)
+    zs = np.unpackbits(packed[:, n_bytes:], axis=1, count=n_qubits, bitorder="little").astype(bool)
+    return xs, zs
+
+def save_hamiltonian(path, coeffs, paulis, chunk_size=65536):
+    """
+    Write a Hamiltonian to disk as a memory-mappable packed symplectic store. Terms are converted chunk by chunk,
+    so the Pauli strings never need to be held in packed and string form at the same time.
+    path (String): Directory to write the store into (created if it does not exist).
+    coeffs (Iterable[Float]): Pauli coefficients in Hamiltonian.
+    paulis (Iterable[String]): Corresponding Pauli strings in Hamiltonian (same order as coeffs).
+    chunk_size (Int): Number of terms converted at once.
+
+    Returns:
+    (PackedHamiltonian) the store, opened read-only.
+    """
+    num_terms = len(paulis)
+    assert len(coeffs) == num_terms, f"Number of coefficients ({len(coeffs)}) does not match number of Paulis ({num_terms})."
+    assert num_terms > 0, "Hamiltonian has no terms."
+    n_qubits = len(paulis[0])
+    n_bytes = (n_qubits + 7)//8
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "meta.json"), "w") as meta_file:
+        json.dump({"n_qubits": n_qubits, "num_terms": num_terms}, meta_file, indent=4)
+    coeffs_map = np.lib.format.open_memmap(os.path.join(path, "coeffs.npy"), mode="w+", dtype=np.float64, shape=(num_terms,))
+    paulis_map = np.lib.format.open_memmap(os.path.join(path, "paulis.npy"), mode="w+", dtype=np.uint8, shape=(num_terms, 2*n_bytes))
+    for start in range(0, num_terms, chunk_size):
+        stop = min(start + chunk_size, num_terms)
+        coeffs_map[start:stop] = np.real(np.asarray(coeffs[start:stop]))
+        paulis_map[start:stop] = pauli_strings_to_symplectic(paulis[start:stop], n_qubits)
+    coeffs_map.flush()
+    paulis_map.flush()
+    del coeffs_map, paulis_map
+    return PackedHamiltonian(path)
+
+
+class PackedHamiltonian:
+    """
+    Read-only, memory-mapped Hamiltonian in packed symplectic form, as written by save_hamiltonian().
+    Can be passed as `paulis` to vqe_cafqa_stim() and get_ref_energy() (the coefficients are then taken from the store).
+    """
+
+    def __init__(self, path, chunk_size=65536, num_threads=1):
+        """
+        path (String): Directory of the store.
+        chunk_size (Int): Number of terms processed at once during evaluation; bounds peak memory.
+        num_threads (Int): Number of threads used to evaluate chunks.
+        """
+        with open(os.path.join(path, "meta.json")) as meta_file:
+            meta = json.load(meta_file)
+        self.path = path
+        self.n_qubits = meta["n_qubits"]
+        self.chunk_size = chunk_size
+        self.num_threads = num_threads
+        self.coeffs = np.load(os.path.join(path, "coeffs.npy"), mmap_mode="r")
+        self.packed = np.load(os.path.join(path, "paulis.npy"), mmap_mode="r")
+        assert len(self.coeffs) == meta["num_terms"] and len(self.packed) == meta["num_terms"], f"Store {path} is corrupted."
+
+    def __len__(self):
+        return len(self.coeffs)
+
+    def chunks(self):
+        """
+        Returns:
+        Iterator over (coeffs, packed Paulis) views of at most chunk_size terms.
+        """
+        for start in range(0, len(self), self.chunk_size):
+            yield self.coeffs[start:start + self.chunk_size], self.packed[start:start + self.chunk_size]
+
+    def paulis(self):
+        """
+        Returns:
+        List[String] of all Pauli strings (materializes the whole Hamiltonian, only use for small stores).
+        """
+        return symplectic_to_pauli_strings(np.asarray(self.packed), self.n_qubits)
+
+    def energy(self, inverse_tableau):
+        """
+        Energy of the stabilizer state C|0...0>, where C is the Clifford circuit with the given inverse tableau.
+        Each term P contributes <0|C^dag P C|0>, i.e. the sign of C^-1(P) if it contains no X/Y component and 0 otherwise.
+        inverse_tableau (stim.Tableau): Inverse tableau of the circuit, e.g. TableauSimulator.current_inverse_tableau().
+
+        Returns:
+        (Float) energy.
+        """
+        x2x, x2z, z2x, z2z, x_signs, z_signs = inverse_tableau.to_numpy()
+        # generators g_k = C^-1(X_0), ..., C^-1(X_n-1), C^-1(Z_0), ..., C^-1(Z_n-1) as i^e_k X^c_k Z^d_k
+        gen_x = np.concatenate([x2x, z2x]).astype(np.float32)
+        gen_z = np.concatenate([x2z, z2z]).astype(np.float32)
+        gen_phase = np.concatenate([np.sum(x2x & x2z, axis=1) + 2*x_signs, np.sum(z2x & z2z, axis=1) + 2*z_signs]).astype(np.float32)
+        # C^-1(P) = i^(#Y) prod_k g_k^s_k, with s = (xs, zs). Reordering X^c Z^d X^c' Z^d' = (-1)^(d.c') X^(c+c') Z^(d+d')
+        # adds the sign (-1)^(sum_{j<k} s_j s_k d_j.c_k), a quadratic form in s with strictly upper triangular matrix
+        commutation = np.triu((gen_z @ gen_x.T) % 2, 1).astype(np.float32)
+
+        def chunk_energy(chunk):
+            coeffs, packed = chunk
+            xs, zs = unpack_symplectic(np.asarray(packed), self.n_qubits)
+            selection = np.concatenate([xs, zs], axis=1).astype(np.float32)
+            # float32 products of 0/1 matrices are exact while the sums stay below 2^24
+            out_x = (selection @ gen_x) % 2
+            quadratic = np.sum((selection @ commutation) * selection, axis=1) % 2
+            phase = np.sum(xs & zs, axis=1) + selection @ gen_phase + 2*quadratic
+            expectations = np.where(np.rint(phase) % 4 == 0, 1., -1.)
+            expectations[out_x.any(axis=1)] = 0.
+            return np.dot(coeffs, expectations)
+
+        if self.num_threads > 1:
+            with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
+                return float(sum(executor.map(chunk_energy, self.chunks())))
+        return float(sum(chunk_energy(chunk) for chunk in self.chunks()))
+
+    def to_matrix(self):
+        """
+        Dense Hamiltonian matrix, built by streaming the terms. Qubit ordering matches get_ref_energy() for the same Pauli strings.
+
+        Returns:
+        (np.ndarray) complex matrix of shape (2^n_qubits, 2^n_qubits).
+        """
+        n = self.n_qubits
+        dim = 2**n
+        basis = np.arange(dim)
+        # get_ref_energy() reads the strings in Qiskit ordering: character i acts on bit n-1-i of the basis index
+        bit_values = 2**np.arange(n - 1, -1, -1)
+        matrix = np.zeros((dim, dim), dtype=complex)
+        for coeffs, packed in self.chunks():
+            xs, zs = unpack_symplectic(np.asarray(packed), n)
+            x_masks = xs.astype(np.int64) @ bit_values
+            z_masks = zs.astype(np.int64) @ bit_values
+            num_ys = np.sum(xs & zs, axis=1)
+            for coeff, x_mask, z_mask, num_y in zip(coeffs, x_masks, z_masks, num_ys):
+                # P|j> = i^(#Y) (-1)^(popcount(j & z_mask)) |j ^ x_mask>
+                parity = np.zeros(dim, dtype=np.int64)
+                masked = basis & z_mask
+                while masked.any():
+                    parity ^= masked & 1
+                    masked >>= 1
+                matrix[basis ^ x_mask, basis] += coeff * 1j**num_y * (1 - 2*parity)
+        return matrix
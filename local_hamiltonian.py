@@ -0,0 +1,161 @@
+import numpy as np
+import stim
+from heapq import heappush, heappop
+from bisect import bisect_left
+
+# stim Pauli codes
+PAULI_CODES = {"I": 0, "X": 1, "Y": 2, "Z": 3}
+
+# tuple of gate names -> table mapping the Pauli codes on the gate's qubits to (new codes, sign) under P -> G^dag P G
+_CONJUGATION_TABLES = {}
+
+
+def conjugation_table(gate_names):
+    """
+    Lookup table for conjugating Paulis backwards through a Clifford gate (or a sequence of gates on the same qubits), built once from its stim tableau.
+    gate_names (Tuple[String]): stim gate names in time order, e.g. ("CX",) or ("SQRT_Y", "S_DAG").
+
+    Returns:
+    (Dict) maps tuple of Pauli codes (one per gate qubit) to (tuple of Pauli codes, sign).
+    """
+    if gate_names not in _CONJUGATION_TABLES:
+        tableau = None
+        for gate_name in gate_names:
+            try:
+                gate_tableau = stim.Tableau.from_named_gate(gate_name)
+            except (IndexError, ValueError) as e:
+                raise Exception(f'Gate {gate_name} is not a unitary Clifford gate') from e
+            tableau = gate_tableau if tableau is None else tableau.then(gate_tableau)
+        inverse = tableau.inverse()
+        n = len(inverse)
+        table = {}
+        for codes in np.ndindex(*([4]*n)):
+            pauli = stim.PauliString(n)
+            for q, code in enumerate(codes):
+                pauli[q] = int(code)
+            image = inverse(pauli)
+            table[tuple(int(code) for code in codes)] = (tuple(image[q] for q in range(n)), int(image.sign.real))
+        _CONJUGATION_TABLES[gate_names] = table
+    return _CONJUGATION_TABLES[gate_names]
+
+def flatten_circuit(circuit, n_qubits):
+    """
+    Split a stim circuit into single gate applications and index them by qubit. Consecutive single-qubit gates on a qubit are fused into one.
+    circuit (stim.Circuit): Clifford circuit (no measurements/resets).
+    n_qubits (Int): Number of qubits.
+
+    Returns:
+    (List[(Dict, Tuple[Int])], List[List[Int]]) (gates as (conjugation table, qubits) in time order, gate indices acting on each qubit in time order).
+    """
+    gates = []
+    qubit_gates = [[] for _ in range(n_qubits)]
+    # not yet emitted single-qubit gate names on each qubit
+    pending = [[] for _ in range(n_qubits)]
+
+    def emit(gate_names, qubits):
+        for q in qubits:
+            qubit_gates[q].append(len(gates))
+        gates.append((conjugation_table(gate_names), qubits))
+
+    def flush(q):
+        if pending[q]:
+            emit(tuple(pending[q]), (q,))
+            pending[q] = []
+
+    for instruction in circuit.flattened():
+        name = instruction.name
+        if name in ("I", "TICK"):
+            continue
+        arity = len(next(iter(conjugation_table((name,)))))
+        targets = [target.value for target in instruction.targets_copy()]
+        if arity == 1:
+            for q in targets:
+                pending[q].append(name)
+            continue
+        for i in range(0, len(targets), arity):
+            qubits = tuple(targets[i:i + arity])
+            for q in qubits:
+                flush(q)
+            emit((name,), qubits)
+    for q in range(n_qubits):
+        flush(q)
+    return gates, qubit_gates
+
+
+class LocalHamiltonian:
+    """
+    Hamiltonian stored as sparse Pauli terms, evaluated by light-cone backpropagation instead of a full stabilizer tableau.
+    Each term P is conjugated backwards through the Clifford circuit C, visiting only gates in its backwards light cone, and C^dag P C is evaluated on |0...0>.
+    The cost per term scales with its light cone (term locality x depth for local entanglement, e.g. efficientsu2_pairwise), not with n_qubits^2.
+    Every term is walked separately in Python, so this only beats the stim tableau for large systems (above about 500 qubits for a periodic Ising chain).
+    Can be passed as `paulis` to vqe_cafqa_stim() (the coefficients are then taken from the Hamiltonian).
+    """
+
+    def __init__(self, coeffs, paulis):
+        """
+        coeffs (Iterable[Float]): Pauli coefficients in Hamiltonian.
+        paulis (Iterable[String]): Corresponding Pauli strings in Hamiltonian (same order as coeffs), e.g. from ising_model().
+        """
+        assert len(coeffs) == len(paulis), f"Number of coefficients ({len(coeffs)}) does not match number of Paulis ({len(paulis)})."
+        self.n_qubits = len(paulis[0])
+        self.coeffs = np.real(np.array(coeffs))
+        self.terms = [{q: PAULI_CODES[p] for q, p in enumerate(pauli) if p != "I"} for pauli in paulis]
+
+    def __len__(self):
+        return len(self.terms)
+
+    def expectations(self, circuit):
+        """
+        Expectation values of all terms for the state C|0...0>.
+        circuit (stim.Circuit): Clifford circuit C.
+
+        Returns:
+        (np.ndarray) expectation value (-1, 0 or 1) for each term.
+        """
+        gates, qubit_gates = flatten_circuit(circuit, self.n_qubits)
+        return np.array([self._expectation(term, gates, qubit_gates) for term in self.terms], dtype=float)
+
+    def energy(self, circuit):
+        """
+        circuit (stim.Circuit): Clifford circuit C.
+
+        Returns:
+        (Float) energy of C|0...0>.
+        """
+        return float(np.dot(self.coeffs, self.expectations(circuit)))
+
+    @staticmethod
+    def _expectation(term, gates, qubit_gates):
+        pauli = dict(term)
+        sign = 1
+        # max-heap of gate indices still to be applied, latest gate first
+        heap = []
+        queued = set()
+
+        def queue_previous(q, before):
+            # latest gate on qubit q before gate index `before`
+            k = bisect_left(qubit_gates[q], before)
+            if k > 0:
+                gate_idx = qubit_gates[q][k - 1]
+                if gate_idx not in queued:
+                    queued.add(gate_idx)
+                    heappush(heap, -gate_idx)
+
+        num_gates = len(gates)
+        for q in pauli:
+            queue_previous(q, num_gates)
+        while heap:
+            gate_idx = -heappop(heap)
+            table, qubits = gates[gate_idx]
+            codes, gate_sign = table[tuple(pauli.get(q, 0) for q in qubits)]
+            sign *= gate_sign
+            for q, code in zip(qubits, codes):
+                if code == 0:
+                    pauli.pop(q, None)
+                else:
+                    pauli[q] = code
+                    queue_previous(q, gate_idx)
+        # <0|P|0> vanishes if P has an X or Y component
+        if any(code != 3 for code in pauli.values()):
+            return 0.
+        return float(sign)
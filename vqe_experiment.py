@@ -1,19 +1,13 @@
 import numpy as np
-
-from qiskit_nature.units import DistanceUnit
-from qiskit_nature.second_q.circuit.library import HartreeFock
-from qiskit_nature.second_q.transformers import ActiveSpaceTransformer
-from qiskit_nature.second_q.drivers import PySCFDriver
-from qiskit_nature.second_q.mappers import ParityMapper, QubitConverter
-
-from skquant.opt import minimize
-import hypermapper
 import json
 import sys
 from numbers import Number
 
 from vqe_helpers import *
 from circuit_manipulation import *
+from gradient_optimizers import *
+
+# qiskit_nature/PySCF, skquant and hypermapper are imported on first use inside molecule(), run_vqe() and run_cafqa().
 
 
 def molecule(atom_string, new_num_orbitals=None, **kwargs):
@@ -26,6 +20,12 @@ def molecule(atom_string, new_num_orbitals=None, **kwargs):
     Returns:
     (Iterable[Float], Iterable[String], String) (Pauli coefficients, Pauli strings, Hartree-Fock bitstring)
     """
+    from qiskit_nature.units import DistanceUnit
+    from qiskit_nature.second_q.circuit.library import HartreeFock
+    from qiskit_nature.second_q.transformers import ActiveSpaceTransformer
+    from qiskit_nature.second_q.drivers import PySCFDriver
+    from qiskit_nature.second_q.mappers import ParityMapper, QubitConverter
+
     converter = QubitConverter(ParityMapper(), two_qubit_reduction=True)
     driver = PySCFDriver(
         atom=atom_string,
@@ -113,9 +113,9 @@ def ising_model(N, Jx, h, Jy=0., periodic=False):
             paulis.append("I"*j+"Z"+"I"*(N-j-1))
     return coeffs, paulis, "0"*N
 
-def run_vqe(n_qubits, coeffs, paulis, param_guess, budget, shots, mode, backend, save_dir, loss_file, params_file, vqe_kwargs):
+def run_vqe(n_qubits, coeffs, paulis, param_guess, budget, shots, mode, backend, save_dir, loss_file, params_file, vqe_kwargs, optimizer="imfil", optimizer_kwargs=None):
     """
-    Run VQE instance. Uses skquant for optimization.
+    Run VQE instance. Uses skquant's derivative-free imfil or a gradient-based optimizer for optimization.
     n_qubits (Int): Number of qubits in circuit.
     coeffs (Iterable[Float]): Pauli coefficients in Hamiltonian.
     paulis (Iterable[String]): Corresponding Pauli strings in Hamiltonian (same order as coeffs).
@@ -128,18 +128,44 @@ def run_vqe(n_qubits, coeffs, paulis, param_guess, budget, shots, mode, backend,
     loss_file (String): Name of save file for VQE loss/energy.
     params_file (String): Name of save file for VQE parameters.
     vqe_kwargs (Dict): Dictionary with additional keyword arguments for vqe() call.
+    optimizer (String): ["imfil", "adam", "lbfgsb", "spsa"]. The gradient-based optimizers evaluate all points of one iteration (parameter shifts or SPSA perturbations) in a single batched execution.
+    optimizer_kwargs (Dict): Additional keyword arguments for the optimizer function (adam(), lbfgsb() or spsa()).
 
     Returns:
     Tuple of energy estimate and optimized parameters.
     """
     # check right number of parameters given
-    _, num_params = efficientsu2_full(n_qubits, vqe_kwargs["ansatz_reps"])
+    num_params = ansatz_num_params(vqe_kwargs.get("ansatz_func", efficientsu2_full), n_qubits, vqe_kwargs["ansatz_reps"])
     if len(param_guess) == 0:
         param_guess = [0] * num_params
     assert len(param_guess) == num_params, f"Number of parameters given ({len(param_guess)}) does not match ansatz ({num_params})." 
 
-    bounds = np.array([[0, np.pi*2]]*num_params)
     initial_point = np.array(param_guess)
+    if optimizer != "imfil":
+        if optimizer_kwargs is None:
+            optimizer_kwargs = {}
+        execution_kwargs = dict(
+            loss_filename=save_dir + "/" + loss_file,
+            params_filename=save_dir + "/" + params_file,
+            paulis=paulis,
+            coeffs=coeffs,
+            shots=shots,
+            backend=backend,
+            mode=mode,
+            **vqe_kwargs
+        )
+        if optimizer == "adam":
+            return adam(lambda c: vqe_gradient(n_qubits, c, **execution_kwargs), initial_point, budget, **optimizer_kwargs)
+        elif optimizer == "lbfgsb":
+            return lbfgsb(lambda c: vqe_gradient(n_qubits, c, **execution_kwargs), initial_point, budget, **optimizer_kwargs)
+        elif optimizer == "spsa":
+            return spsa(lambda cs: vqe_energies(n_qubits, cs, **execution_kwargs), initial_point, budget, **optimizer_kwargs)
+        else:
+            raise Exception(f'Invalid optimizer {optimizer}')
+
+    from skquant.opt import minimize
+
+    bounds = np.array([[0, np.pi*2]]*num_params)
     vqe_result = minimize(
             lambda c: vqe(
                 n_qubits=n_qubits,
@@ -178,10 +204,12 @@ def run_cafqa(n_qubits, coeffs, paulis, param_guess, budget, save_dir, loss_file
     Returns:
     Tuple of energy estimate and optimized CAFQA parameters.
     """
+    import hypermapper
+
     # check right number of parameters given
     ansatz_func = vqe_kwargs.get("ansatz_func", efficientsu2_full)
     ansatz_reps = vqe_kwargs.get("ansatz_reps", 1)
-    _, num_params = ansatz_func(n_qubits, ansatz_reps)
+    num_params = ansatz_num_params(ansatz_func, n_qubits, ansatz_reps)
     if len(param_guess) == 0:
         param_guess = [0] * num_params
     assert len(param_guess) == num_params, f"Number of parameters given ({len(param_guess)}) does not match ansatz ({num_params})." 
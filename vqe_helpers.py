@@ -1,42 +1,44 @@
-from qiskit import QuantumCircuit, ClassicalRegister, QuantumRegister, Aer, execute, IBMQ, transpile
-from qiskit.transpiler.passes import RemoveBarriers
-from qiskit.providers.aer import AerSimulator
-
-from qiskit.circuit.library import EfficientSU2
-
-from qiskit.quantum_info import Pauli, Operator
-
-
 import numpy as np
 from numpy.linalg import eigh
 import csv
 import stim
 from circuit_manipulation import *
+from hamiltonian_storage import *
+from ansatz_builders import *
+from local_hamiltonian import *
 
 from timeit import default_timer as timer
 
+# Qiskit is imported inside the functions that need it, so that the stim CAFQA path only loads numpy and stim.
 
 def get_ref_energy(coeffs, paulis, return_groundstate=False):
     """
     Compute theoretical minimum energy.
-    coeffs (Iterable[Float]): Pauli coefficients in Hamiltonian.
-    paulis (Iterable[String]): Corresponding Pauli strings in Hamiltonian (same order as coeffs).
+    coeffs (Iterable[Float]): Pauli coefficients in Hamiltonian (ignored if paulis is a PackedHamiltonian).
+    paulis (Iterable[String], PackedHamiltonian): Corresponding Pauli strings in Hamiltonian (same order as coeffs), or a packed Hamiltonian store.
     return_groundstate (Bool): Whether to return groundstate.
     
     Returns:
     (Float) minimum energy (optionally also groundstate as array).
     """
-    # the final operation
-    final_op = None
+    if isinstance(paulis, PackedHamiltonian):
+        # stream the store instead of building one Operator per term
+        final_matrix = paulis.to_matrix()
+    else:
+        from qiskit.quantum_info import Pauli, Operator
+
+        # the final operation
+        final_op = None
 
-    for ii, el in enumerate(paulis):
-        if ii == 0:
-            final_op = coeffs[ii]*Operator(Pauli(el))
-        else:
-            final_op += coeffs[ii]*Operator(Pauli(el))
+        for ii, el in enumerate(paulis):
+            if ii == 0:
+                final_op = coeffs[ii]*Operator(Pauli(el))
+            else:
+                final_op += coeffs[ii]*Operator(Pauli(el))
+        final_matrix = final_op.data
    
     # compute the eigenvalues
-    evals, evecs = eigh(final_op.data)
+    evals, evecs = eigh(final_matrix)
    
     # get the minimum eigenvalue
     min_eigenval = np.min(evals)
@@ -48,7 +50,7 @@ def get_ref_energy(coeffs, paulis, return_groundstate=False):
 def hartreefock(circuit, HF_bitstring=None, **kwargs):
     """
     Append the EfficientSU2 (full entanglement) ansatz to input circuit, inplace.
-    circuit (QuantumCircuit).
+    circuit (QuantumCircuit, stim.Circuit).
     HF_bitstring (String): Bitstring to initialize to, e.g. "01101" -> |01101> (in Qiskit ordering |10110>)
     kwargs (Dict): All the arguments that need to be passed on to the next function calls.
     """
@@ -56,7 +58,10 @@ def hartreefock(circuit, HF_bitstring=None, **kwargs):
         return
     for i in range(len(HF_bitstring)):
         if HF_bitstring[i] == "1":
-            circuit.x(i)
+            if isinstance(circuit, stim.Circuit):
+                circuit.append("X", [i])
+            else:
+                circuit.x(i)
 
 def efficientsu2_full(n_qubits, repetitions):
     """
@@ -67,11 +72,28 @@ def efficientsu2_full(n_qubits, repetitions):
     Returns: 
     (QuantumCircuit, Int) (ansatz, #parameters).
     """
+    from qiskit.circuit.library import EfficientSU2
+
     ansatz = EfficientSU2(num_qubits=n_qubits, entanglement='full', reps=repetitions, insert_barriers=True)
     num_params_ansatz = len(ansatz.parameters)
     ansatz = ansatz.decompose()
     return ansatz, num_params_ansatz
 
+def ansatz_num_params(ansatz_func, n_qubits, ansatz_reps=1):
+    """
+    Number of ansatz parameters, without building the circuit if the ansatz provides num_parameters() (e.g. HardwareEfficientAnsatz).
+    ansatz_func (Function): Defines the ansatz circuit. Returns (ansatz, #parameters).
+    n_qubits (Int): Number of qubits in circuit.
+    ansatz_reps (Int): # ansatz repetitions.
+
+    Returns:
+    (Int) #parameters.
+    """
+    if hasattr(ansatz_func, "num_parameters"):
+        return ansatz_func.num_parameters(n_qubits, ansatz_reps)
+    _, num_params = ansatz_func(n_qubits, ansatz_reps)
+    return num_params
+
 def add_ansatz(circuit, ansatz_func, parameters, ansatz_reps=1, **kwargs):
     """
     Append an ansatz (full entanglement) to input circuit, inplace.
@@ -100,6 +122,8 @@ def vqe_circuit(n_qubits, parameters, hamiltonian, init_func=hartreefock, ansatz
     Returns:
     (QuantumCircuit) VQE circuit for a specific Pauli string.
     """
+    from qiskit import QuantumCircuit, ClassicalRegister, QuantumRegister
+
     qr = QuantumRegister(n_qubits)
     cr = ClassicalRegister(n_qubits)
     circuit = QuantumCircuit(qr, cr)
@@ -127,21 +151,22 @@ def vqe_circuit(n_qubits, parameters, hamiltonian, init_func=hartreefock, ansatz
             circuit.measure(qr[i], cr[i])
     return circuit
 
-def all_transpiled_vqe_circuits(n_qubits, parameters, paulis, backend, seed_transpiler=25, remove_barriers=True, **kwargs) -> dict:
+def transpile_vqe_circuit(n_qubits, parameters, backend, seed_transpiler=25, remove_barriers=True, **kwargs):
     """
-    Transpiles all VQE circuits for a specific backend efficienlty (uses the fact that structure is the same / same ansatz -> similar transpiled circuits)
+    Transpile the VQE circuit (without the Pauli measurement bases) for a specific backend.
     n_qubits (Int): Number of qubits in circuit.
-    parameters (Iterable[Float]): VQE parameters.
-    paulis (Iterable[String]): Corresponding Pauli strings in Hamiltonian (same order as coeffs).
-    backend (IBM backend): Can be simulator, fake backend or real backend; irrelevant with mode = "no_noisy_sim".
+    parameters (Iterable[Float], Iterable[Parameter]): VQE parameters; can be unbound Qiskit parameters, to be assigned after transpilation.
+    backend (IBM backend): Can be simulator, fake backend or real backend.
     seed_transpiler (Int): Random seed for the transpiler. Default is 25 because favorite number of Jason D. Chadwick.
     remove_barriers (Bool): Whether to remove barriers.
     kwargs (Dict): All the arguments that need to be passed on to the next function calls.
     
     Returns:
-    List[QuantumCircuit] of all transpiled VQE circuits.
+    (QuantumCircuit, Dict) (transpiled circuit without measurements, mapping from virtual to physical qubits).
     """
-    backend_qubits = backend.configuration().n_qubits
+    from qiskit import transpile
+    from qiskit.transpiler.passes import RemoveBarriers
+
     circuit = vqe_circuit(n_qubits, parameters, n_qubits*'Z', **kwargs)
     if remove_barriers:
         circuit = RemoveBarriers()(circuit)
@@ -155,6 +180,23 @@ def all_transpiled_vqe_circuits(n_qubits, parameters, paulis, backend, seed_tran
             virtual_to_physical_mapping[inst[2][0].index] = inst[1][0].index
     # remove final measurements
     t_circuit.remove_final_measurements()
+    return t_circuit, virtual_to_physical_mapping
+
+def add_transpiled_measurements(t_circuit, virtual_to_physical_mapping, n_qubits, paulis, backend):
+    """
+    Create one circuit per Pauli string from a transpiled VQE circuit, by appending the (native gate) measurement bases.
+    t_circuit (QuantumCircuit): Transpiled circuit without measurements, see transpile_vqe_circuit().
+    virtual_to_physical_mapping (Dict): Mapping from virtual to physical qubits.
+    n_qubits (Int): Number of qubits in circuit.
+    paulis (Iterable[String]): Corresponding Pauli strings in Hamiltonian (same order as coeffs).
+    backend (IBM backend): Backend that t_circuit was transpiled for.
+    
+    Returns:
+    List[QuantumCircuit] of all transpiled VQE circuits.
+    """
+    from qiskit import QuantumCircuit
+
+    backend_qubits = backend.configuration().n_qubits
     # create all transpiled circuits
     all_transpiled_circuits = []
     for pauli in paulis:
@@ -178,6 +220,70 @@ def all_transpiled_vqe_circuits(n_qubits, parameters, paulis, backend, seed_tran
     # print(all_transpiled_circuits[-2].draw(fold=-1))
     return all_transpiled_circuits
 
+def all_transpiled_vqe_circuits(n_qubits, parameters, paulis, backend, seed_transpiler=25, remove_barriers=True, **kwargs) -> dict:
+    """
+    Transpiles all VQE circuits for a specific backend efficienlty (uses the fact that structure is the same / same ansatz -> similar transpiled circuits)
+    n_qubits (Int): Number of qubits in circuit.
+    parameters (Iterable[Float]): VQE parameters.
+    paulis (Iterable[String]): Corresponding Pauli strings in Hamiltonian (same order as coeffs).
+    backend (IBM backend): Can be simulator, fake backend or real backend; irrelevant with mode = "no_noisy_sim".
+    seed_transpiler (Int): Random seed for the transpiler. Default is 25 because favorite number of Jason D. Chadwick.
+    remove_barriers (Bool): Whether to remove barriers.
+    kwargs (Dict): All the arguments that need to be passed on to the next function calls.
+    
+    Returns:
+    List[QuantumCircuit] of all transpiled VQE circuits.
+    """
+    t_circuit, virtual_to_physical_mapping = transpile_vqe_circuit(n_qubits, parameters, backend, seed_transpiler, remove_barriers, **kwargs)
+    return add_transpiled_measurements(t_circuit, virtual_to_physical_mapping, n_qubits, paulis, backend)
+
+def all_transpiled_vqe_circuits_batch(n_qubits, parameter_sets, paulis, backend, seed_transpiler=25, remove_barriers=True, **kwargs):
+    """
+    Transpiled VQE circuits for several parameter sets. The parameterized circuit is transpiled only once and the parameter sets are assigned afterwards
+    (a single parameter set is transpiled bound, as in all_transpiled_vqe_circuits(), which lets the transpiler simplify the rotations).
+    n_qubits (Int): Number of qubits in circuit.
+    parameter_sets (Iterable[Iterable[Float]]): VQE parameter sets.
+    paulis (Iterable[String]): Corresponding Pauli strings in Hamiltonian (same order as coeffs).
+    backend (IBM backend): Can be simulator, fake backend or real backend.
+    seed_transpiler (Int): Random seed for the transpiler.
+    remove_barriers (Bool): Whether to remove barriers.
+    kwargs (Dict): All the arguments that need to be passed on to the next function calls.
+    
+    Returns:
+    List[QuantumCircuit] of all transpiled VQE circuits (circuit index = set index * #paulis + pauli index).
+    """
+    from qiskit.circuit import ParameterVector
+
+    if len(parameter_sets) == 1 or parameter_sets[0] is None:
+        return [tcirc for parameters in parameter_sets for tcirc in all_transpiled_vqe_circuits(n_qubits, parameters, paulis, backend, seed_transpiler, remove_barriers, **kwargs)]
+    # named differently from the ansatz parameters (EfficientSU2 uses θ) to avoid name conflicts on assignment
+    theta = ParameterVector("φ", len(parameter_sets[0]))
+    t_circuit, virtual_to_physical_mapping = transpile_vqe_circuit(n_qubits, list(theta), backend, seed_transpiler, remove_barriers, **kwargs)
+    template_circuits = add_transpiled_measurements(t_circuit, virtual_to_physical_mapping, n_qubits, paulis, backend)
+    all_transpiled_circuits = []
+    for parameters in parameter_sets:
+        for template in template_circuits:
+            # the transpiler may drop parameters of gates that cancel
+            binding = {param: value for param, value in zip(theta, parameters) if param in template.parameters}
+            all_transpiled_circuits.append(template.assign_parameters(binding))
+    return all_transpiled_circuits
+
+def run_in_chunks(run, circuits, max_experiments=None):
+    """
+    Execute circuits in jobs of at most max_experiments circuits each.
+    run (Function): Takes a list of circuits and returns a job, e.g. lambda circs: execute(circs, backend=backend, shots=shots).
+    circuits (List[QuantumCircuit]): Circuits to execute.
+    max_experiments (Int): Max number of circuits per job (if None, submit all circuits as one job).
+    
+    Returns:
+    (Function) get_counts(circuit index) over all jobs.
+    """
+    chunk_size = max_experiments if max_experiments else max(len(circuits), 1)
+    # submit all jobs first, so that they can run concurrently
+    jobs = [run(circuits[start:start + chunk_size]) for start in range(0, len(circuits), chunk_size)]
+    results = [job.result() for job in jobs]
+    return lambda idx: results[idx//chunk_size].get_counts(idx % chunk_size)
+
 def compute_expectations(n_qubits, parameters, paulis, shots, backend, mode, **kwargs):
     """
     Compute the expection values of the Pauli strings.
@@ -192,44 +298,68 @@ def compute_expectations(n_qubits, parameters, paulis, shots, backend, mode, **k
     Returns:
     List[Float] of expection value for each Pauli string.
     """
-    #evaluate the circuits
+    return compute_expectations_batch(n_qubits, [parameters], paulis, shots, backend, mode, **kwargs)[0]
+
+def compute_expectations_batch(n_qubits, parameter_sets, paulis, shots, backend, mode, **kwargs):
+    """
+    Compute the expection values of the Pauli strings for several VQE parameter sets, with all circuits executed together
+    (the parameterized circuit is transpiled once; with mode = "device_execution", the circuits are split into jobs of at most backend.configuration().max_experiments circuits).
+    n_qubits (Int): Number of qubits in circuit.
+    parameter_sets (Iterable[Iterable[Float]]): VQE parameter sets.
+    paulis (Iterable[String]): Corresponding Pauli strings in Hamiltonian (same order as coeffs).
+    backend (IBM backend): Can be simulator, fake backend or real backend; only with mode = "device_execution".
+    mode (String): ["no_noisy_sim", "device_execution", "noisy_sim"].
+    shots (Int): Number of VQE circuit execution shots.
+    kwargs (Dict): All the arguments that need to be passed on to the next function calls.
+    
+    Returns:
+    List[List[Float]] of expection value for each Pauli string, one list per parameter set.
+    """
+    from qiskit import Aer, execute
+    from qiskit.providers.aer import AerSimulator
+
+    #evaluate the circuits (circuit index = set index * #paulis + pauli index)
     if mode == 'no_noisy_sim':
         #get all the vqe circuits
-        circuits = [vqe_circuit(n_qubits, parameters, pauli, **kwargs) for pauli in paulis]
-        result = execute(circuits, backend=Aer.get_backend("qasm_simulator"), shots=shots).result()
+        circuits = [vqe_circuit(n_qubits, parameters, pauli, **kwargs) for parameters in parameter_sets for pauli in paulis]
+        get_counts = run_in_chunks(lambda circs: execute(circs, backend=Aer.get_backend("qasm_simulator"), shots=shots), circuits)
     elif mode == 'device_execution':
-        tcircs = all_transpiled_vqe_circuits(n_qubits, parameters, paulis, backend, **kwargs)
-        job = execute(tcircs, backend=backend, shots=shots)
-        result = job.result()
+        tcircs = all_transpiled_vqe_circuits_batch(n_qubits, parameter_sets, paulis, backend, **kwargs)
+        # real backends limit the number of circuits per job
+        max_experiments = getattr(backend.configuration(), "max_experiments", None)
+        get_counts = run_in_chunks(lambda circs: execute(circs, backend=backend, shots=shots), tcircs, max_experiments)
     elif mode == 'noisy_sim':
         sim_device = AerSimulator.from_backend(backend)
-        tcircs = all_transpiled_vqe_circuits(n_qubits, parameters, paulis, backend, **kwargs)
-        result = sim_device.run(tcircs, shots=shots).result()
+        tcircs = all_transpiled_vqe_circuits_batch(n_qubits, parameter_sets, paulis, backend, **kwargs)
+        get_counts = run_in_chunks(lambda circs: sim_device.run(circs, shots=shots), tcircs)
     else:
         raise Exception('Invalid circuit execution mode')
     print("all circs run!")
 
-    all_counts = []
-    for __, _id in enumerate(paulis):
-        if _id == len(_id)*'I':
-            all_counts.append({len(_id)*'0':shots})
-        else:
-            all_counts.append(result.get_counts(__))
-    
-    #compute the expectations
-    expectations = []
-    for i, count in enumerate(all_counts):
-        #initiate the expectation value to 0
-        expectation_val = 0
-        #compute the expectation
-        for el in count.keys():
-            sign = 1
-            #change sign if there are an odd number of ones
-            if el.count('1')%2 == 1:
-                sign = -1
-            expectation_val += sign*count[el]/shots
-        expectations.append(expectation_val)
-    return expectations
+    all_expectations = []
+    for set_idx in range(len(parameter_sets)):
+        all_counts = []
+        for __, _id in enumerate(paulis):
+            if _id == len(_id)*'I':
+                all_counts.append({len(_id)*'0':shots})
+            else:
+                all_counts.append(get_counts(set_idx*len(paulis) + __))
+        
+        #compute the expectations
+        expectations = []
+        for i, count in enumerate(all_counts):
+            #initiate the expectation value to 0
+            expectation_val = 0
+            #compute the expectation
+            for el in count.keys():
+                sign = 1
+                #change sign if there are an odd number of ones
+                if el.count('1')%2 == 1:
+                    sign = -1
+                expectation_val += sign*count[el]/shots
+            expectations.append(expectation_val)
+        all_expectations.append(expectations)
+    return all_expectations
 
 def vqe(n_qubits, parameters, coeffs, loss_filename=None, params_filename=None, **kwargs):
     """
@@ -261,15 +391,68 @@ def vqe(n_qubits, parameters, coeffs, loss_filename=None, params_filename=None,
             writer.writerow(parameters)
     return loss
 
+def vqe_energies(n_qubits, parameter_sets, coeffs, loss_filename=None, params_filename=None, **kwargs):
+    """
+    Compute the VQE loss/energy for several parameter sets in one batched execution.
+    Only the first parameter set is logged, as it is the current point of the calling optimizer.
+    n_qubits (Int): Number of qubits in circuit.
+    parameter_sets (Iterable[Iterable[Float]]): VQE parameter sets.
+    coeffs (Iterable[Float]): Pauli coefficients in Hamiltonian.
+    loss_filename (String): Path to save file for VQE loss/energy.
+    params_filename (String): Path to save file for VQE parameters.
+    kwargs (Dict): All the arguments that need to be passed on to the next function calls.
+    
+    Returns:
+    (np.ndarray) VQE energy for each parameter set.
+    """
+    start = timer()
+    all_expectations = compute_expectations_batch(n_qubits, parameter_sets, **kwargs)
+    losses = np.array(all_expectations) @ np.array(coeffs)
+    end = timer()
+    print(f'Loss computed by VQE is {losses[0]} ({len(parameter_sets)} parameter sets), in {end - start} s.')
+    
+    if loss_filename is not None:
+        with open(loss_filename, 'a') as file:
+            writer = csv.writer(file)
+            writer.writerow([losses[0]])
+    
+    if params_filename is not None:
+        with open(params_filename, 'a') as file:
+            writer = csv.writer(file)
+            writer.writerow(parameter_sets[0])
+    return losses
+
+def vqe_gradient(n_qubits, parameters, coeffs, **kwargs):
+    """
+    Compute the VQE loss/energy and its parameter-shift gradient. The unshifted and all +-pi/2 shifted parameter sets are executed as one batch.
+    Exact for ansatzes in which every parameter enters a single Pauli rotation (e.g. EfficientSU2).
+    n_qubits (Int): Number of qubits in circuit.
+    parameters (Iterable[Float]): VQE parameters.
+    coeffs (Iterable[Float]): Pauli coefficients in Hamiltonian.
+    kwargs (Dict): All the arguments that need to be passed on to the next function calls.
+    
+    Returns:
+    (Float, np.ndarray) (VQE energy, gradient).
+    """
+    parameters = np.array(parameters, dtype=float)
+    num_params = len(parameters)
+    shifts = np.eye(num_params)*np.pi/2
+    parameter_sets = [parameters] + list(parameters + shifts) + list(parameters - shifts)
+    losses = vqe_energies(n_qubits, parameter_sets, coeffs, **kwargs)
+    gradient = (losses[1:num_params + 1] - losses[num_params + 1:])/2
+    return losses[0], gradient
+
 def vqe_cafqa_stim(inputs, n_qubits, coeffs, paulis, init_func=hartreefock, ansatz_func=efficientsu2_full, ansatz_reps=1, init_last=False, loss_filename=None, params_filename=None, **kwargs):
     """
     Compute the CAFQA VQE loss/energy using stim.
     inputs (Dict): CAFQA VQE parameters (values in 0...3) as passed by hypermapper, e.g.: {"x0": 1, "x1": 0, "x2": 0, "x3": 2}
     n_qubits (Int): Number of qubits in circuit.
-    coeffs (Iterable[Float]): Pauli coefficients in Hamiltonian.
-    paulis (Iterable[String]): Corresponding Pauli strings in Hamiltonian (same order as coeffs).
+    coeffs (Iterable[Float]): Pauli coefficients in Hamiltonian (ignored if paulis is a PackedHamiltonian or LocalHamiltonian).
+    paulis (Iterable[String], PackedHamiltonian, LocalHamiltonian): Corresponding Pauli strings in Hamiltonian (same order as coeffs), a packed Hamiltonian store which is evaluated chunk-wise,
+        or a local Hamiltonian which is evaluated by light-cone backpropagation (for large lattice models).
     initialization (Function): Takes QuantumCircuit and applies state initialization inplace.
-    parametrization (Function): Takes QuantumCircuit and applies ansatz inplace.
+    parametrization (Function): Takes QuantumCircuit and applies ansatz inplace. If it provides stim_circuit() (e.g. HardwareEfficientAnsatz) and the initialization is
+        the built-in hartreefock(), the stim circuit is built directly; custom initialization functions always receive a QuantumCircuit.
     init_last (Bool): Whether initialization should come after (True) or before (False) ansatz.
     loss_filename (String): Path to save file for VQE loss/energy.
     params_filename (String): Path to save file for VQE parameters.
@@ -284,18 +467,38 @@ def vqe_cafqa_stim(inputs, n_qubits, coeffs, paulis, init_func=hartreefock, ansa
     for key in inputs:
         parameters.append(inputs[key]*(np.pi/2))
 
-    vqe_qc = QuantumCircuit(n_qubits)
-    if not init_last:
-        init_func(vqe_qc, **kwargs)
-    add_ansatz(vqe_qc, ansatz_func, parameters, ansatz_reps, **kwargs)
-    if init_last:
-        init_func(vqe_qc, **kwargs)
-    vqe_qc_trans = transform_to_allowed_gates(vqe_qc)
-    stim_qc = qiskit_to_stim(vqe_qc_trans)
-    sim = stim.TableauSimulator()
-    sim.do_circuit(stim_qc)
-    pauli_expect = [sim.peek_observable_expectation(stim.PauliString(p)) for p in paulis]
-    loss = np.dot(coeffs, pauli_expect)
+    if hasattr(ansatz_func, "stim_circuit") and init_func is hartreefock:
+        # native stim ansatz, no Qiskit circuit needed (hartreefock() also handles stim circuits)
+        stim_qc = stim.Circuit()
+        stim_qc.append("I", range(n_qubits))
+        if not init_last:
+            init_func(stim_qc, **kwargs)
+        ansatz_func.stim_circuit(n_qubits, ansatz_reps, [inputs[key] for key in inputs], stim_qc)
+        if init_last:
+            init_func(stim_qc, **kwargs)
+    else:
+        from qiskit import QuantumCircuit
+
+        vqe_qc = QuantumCircuit(n_qubits)
+        if not init_last:
+            init_func(vqe_qc, **kwargs)
+        add_ansatz(vqe_qc, ansatz_func, parameters, ansatz_reps, **kwargs)
+        if init_last:
+            init_func(vqe_qc, **kwargs)
+        vqe_qc_trans = transform_to_allowed_gates(vqe_qc)
+        stim_qc = qiskit_to_stim(vqe_qc_trans)
+    if isinstance(paulis, LocalHamiltonian):
+        # light-cone evaluation, no full tableau needed
+        loss = paulis.energy(stim_qc)
+    elif isinstance(paulis, PackedHamiltonian):
+        sim = stim.TableauSimulator()
+        sim.do_circuit(stim_qc)
+        loss = paulis.energy(sim.current_inverse_tableau())
+    else:
+        sim = stim.TableauSimulator()
+        sim.do_circuit(stim_qc)
+        pauli_expect = [sim.peek_observable_expectation(stim.PauliString(p)) for p in paulis]
+        loss = np.dot(coeffs, pauli_expect)
     end = timer()
     print(f'Loss computed by CAFQA VQE is {loss}, in {end - start} s.')
     